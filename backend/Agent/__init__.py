@@ -1,10 +1,12 @@
 from Agent.agent import *
 from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.responses import StreamingResponse
 from Auth import get_current_user
 import datetime as dt
 from pymongo import ASCENDING
 from Agent.models import ChatMessage
 from datetime import datetime, timezone
+import json
 import logging
 from bson import ObjectId
 from starlette.exceptions import HTTPException
@@ -15,6 +17,129 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def load_chatbot(chat_id: str, request: Request, user) -> tuple[ChatBot | None, str | None]:
+    """
+    Build the level-appropriate chatbot for a chat room from its stored history.
+
+    Args:
+        chat_id (str): The chat room ID.
+        request (Request): The HTTP request object.
+        user: The current user obtained from the access token.
+
+    Returns:
+        tuple: The chatbot and None, or None and an error message if the chat is missing.
+    """
+    # Fetch chat metadata
+    chat = await request.app.database["Chat List"].find_one(
+        {
+            "_id": ObjectId(chat_id),
+            "user_id": ObjectId(user["_id"]),
+        }
+    )
+    if not chat:
+        return None, "Chat not found"
+
+    # Fetch all chat history sorted by timestamp DESCENDING
+    chat_history = (
+        await request.app.database["Messages"]
+        .find(
+            {
+                "chat_id": ObjectId(chat_id),
+                "user_id": ObjectId(user["_id"]),
+            }
+        )
+        .sort("timestamp", ASCENDING)
+        .to_list(length=None)
+    )
+
+    if not chat_history:
+        return None, "Chat History not found"
+
+    # 🕒 Get time difference in minutes from earliest message
+    earliest_message = await request.app.database["Messages"].find_one(
+        {
+            "chat_id": ObjectId(chat_id),
+            "user_id": ObjectId(user["_id"]),
+        },
+        sort=[("timestamp", ASCENDING)],
+    )
+
+    # Getting the time difference between the timestamp of the first message in chat and current time
+    time_difference_minutes = None
+    if earliest_message and "timestamp" in earliest_message:
+        earliest_time = earliest_message["timestamp"]
+        if earliest_time.tzinfo is None:
+            earliest_time = earliest_time.replace(tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        diff = now - earliest_time
+        time_difference_minutes = diff.total_seconds() / 60
+
+    # Formatting chat history
+    formatted_history = [
+        {"role": m["role"], "content": m["message"]}
+        for m in chat_history
+        if m["role"] != "system"
+    ]
+
+    summary = chat.get("summary", "")
+    problem = chat.get("problem_statement", "")
+
+    # Calling Level Based Chabot
+    if time_difference_minutes <= 20:
+        chatbot = ChatBot(
+            messages=formatted_history, summary=summary, problem=problem
+        )
+    elif time_difference_minutes > 20 and time_difference_minutes <= 30:
+        chatbot = ChatBot(
+            messages=formatted_history, summary=summary, problem=problem, level=1
+        )
+    elif time_difference_minutes > 30:
+        chatbot = ChatBot(
+            messages=formatted_history, summary=summary, problem=problem, level=2
+        )
+    return chatbot, None
+
+
+async def save_turn(chat_id: str, request: Request, user, message: str, result: dict):
+    """
+    Persist the user's message, the updated summary and the chatbot's reply.
+
+    Args:
+        chat_id (str): The chat room ID.
+        request (Request): The HTTP request object.
+        user: The current user obtained from the access token.
+        message (str): The user's message.
+        result (dict): The chatbot's response and summary.
+    """
+    # Inserting user request after successfull bot response
+    await request.app.database["Messages"].insert_one(
+        {
+            "chat_id": ObjectId(chat_id),
+            "user_id": ObjectId(user["_id"]),
+            "role": "user",
+            "message": message,
+            "timestamp": dt.datetime.now(timezone.utc),
+        }
+    )
+
+    # Update summary
+    await request.app.database["Chat List"].update_one(
+        {"_id": chat_id, "email": user["email"]},
+        {"$set": {"summary": result["summary"]}},
+    )
+
+    # Insert bot response
+    await request.app.database["Messages"].insert_one(
+        {
+            "chat_id": ObjectId(chat_id),
+            "user_id": ObjectId(user["_id"]),
+            "role": "assistant",
+            "message": result["response"],
+            "timestamp": dt.datetime.now(timezone.utc),
+        }
+    )
+
+
 @agent_router.post("/chat_message", summary="Send a message in a chat room")
 async def chat_message(
     chat_message: ChatMessage,
@@ -36,112 +161,71 @@ async def chat_message(
         dict: The chatbot's response
     """
     try:
-
-        # Fetch chat metadata
-        chat = await request.app.database["Chat List"].find_one(
-            {
-                "_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-            }
-        )
-        if not chat:
+        chatbot, error = await load_chatbot(chat_id, request, user)
+        if error:
             response.status_code = status.HTTP_404_NOT_FOUND
-            return {"error": "Chat not found"}
-
-        # Fetch all chat history sorted by timestamp DESCENDING
-        chat_history = (
-            await request.app.database["Messages"]
-            .find(
-                {
-                    "chat_id": ObjectId(chat_id),
-                    "user_id": ObjectId(user["_id"]),
-                }
-            )
-            .sort("timestamp", ASCENDING)
-            .to_list(length=None)
-        )
+            return {"error": error}
 
-        if not chat_history:
-            response.status_code = status.HTTP_404_NOT_FOUND
-            return {"error": "Chat History not found"}
+        result = await chatbot.chat(message=chat_message.message)
+        await save_turn(chat_id, request, user, chat_message.message, result)
 
-        # 🕒 Get time difference in minutes from earliest message
-        earliest_message = await request.app.database["Messages"].find_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-            },
-            sort=[("timestamp", ASCENDING)],
-        )
+        return {
+            "message": result["response"],
+        }
 
-        # Getting the time difference between the timestamp of the first message in chat and current time
-        time_difference_minutes = None
-        if earliest_message and "timestamp" in earliest_message:
-            earliest_time = earliest_message["timestamp"]
-            if earliest_time.tzinfo is None:
-                earliest_time = earliest_time.replace(tzinfo=timezone.utc)
-            now = datetime.now(timezone.utc)
-            diff = now - earliest_time
-            time_difference_minutes = diff.total_seconds() / 60
-
-        # Formatting chat history
-        formatted_history = [
-            {"role": m["role"], "content": m["message"]}
-            for m in chat_history
-            if m["role"] != "system"
-        ]
-
-        summary = chat.get("summary", "")
-        problem = chat.get("problem_statement", "")
-
-        # Calling Level Based Chabot
-        if time_difference_minutes <= 20:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem
-            )
-        elif time_difference_minutes > 20 and time_difference_minutes <= 30:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem, level=1
-            )
-        elif time_difference_minutes > 30:
-            chatbot = ChatBot(
-                messages=formatted_history, summary=summary, problem=problem, level=2
-            )
-        result = await chatbot.chat(message=chat_message.message)
+    except Exception as e:
+        logger.error(f"Error sending message: {e}")
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Inserting user request after successfull bot response
-        await request.app.database["Messages"].insert_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-                "role": "user",
-                "message": chat_message.message,
-                "timestamp": dt.datetime.now(timezone.utc),
-            }
-        )
 
-        # Update summary
-        await request.app.database["Chat List"].update_one(
-            {"_id": chat_id, "email": user["email"]},
-            {"$set": {"summary": result["summary"]}},
-        )
+@agent_router.post(
+    "/chat_message_stream",
+    summary="Send a message in a chat room and stream the response",
+)
+async def chat_message_stream(
+    chat_message: ChatMessage,
+    chat_id: str,
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+):
+    """
+    Send a message in a chat room and stream the chatbot's response as Server-Sent Events.
 
-        # Insert bot response
-        response = await request.app.database["Messages"].insert_one(
-            {
-                "chat_id": ObjectId(chat_id),
-                "user_id": ObjectId(user["_id"]),
-                "role": "assistant",
-                "message": result["response"],
-                "timestamp": dt.datetime.now(timezone.utc),
-            }
-        )
+    Each chunk of the reply is sent as a `data:` event holding a JSON string. Once the
+    turn is saved, a final `done` event carries the stored response, which can differ
+    from the streamed text when the reflection loop replaces the code.
 
-        return {
-            "message": result["response"],
-        }
+    Args:
+        chat_message (ChatMessage): The chat message data.
+        request (Request): The HTTP request object.
+        response (Response): The HTTP response object.
+        user: The current user obtained from the access token.
 
+    Returns:
+        StreamingResponse: The chatbot's response as an event stream
+    """
+    try:
+        chatbot, error = await load_chatbot(chat_id, request, user)
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise HTTPException(status_code=500, detail=str(e))
+    if error:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"error": error}
+
+    async def event_stream():
+        try:
+            async for event in chatbot.stream_chat(message=chat_message.message):
+                if event["type"] == "delta":
+                    yield f"data: {json.dumps(event['content'])}\n\n"
+                else:
+                    await save_turn(chat_id, request, user, chat_message.message, event)
+                    yield f"event: done\ndata: {json.dumps({'message': event['response']})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming message: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
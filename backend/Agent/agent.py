@@ -6,17 +6,166 @@ It includes methods for summarizing conversations, interacting with models, and
 
 import os
 import re
-import requests
+import time
+import hashlib
+import asyncio
+import functools
+import logging
+import orjson
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, AsyncIterator
 from langgraph.graph import StateGraph, START, END
+from langgraph.config import get_stream_writer
 from Agent.reflection_agent import create_reflection_graph
 from Agent.models import *
 from langchain_core.messages import AIMessage, HumanMessage
-from httpx import AsyncClient
+from httpx import AsyncClient, HTTPError, Limits
+from cachetools import TTLCache
 from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, SystemPromptPart
 from Agent.prompts import *
 
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+CODE_RUNNER_API_URL = os.getenv("CODE_RUNNER_API_URL")
+assert GROQ_API_KEY, "Missing GROQ_API_KEY in .env"
+assert CODE_RUNNER_API_URL, "Missing CODE_RUNNER_API_URL in .env"
+
+# Shared across requests so code-runner calls reuse pooled keep-alive connections
+HTTP_CLIENT = AsyncClient(timeout=30, limits=Limits(max_keepalive_connections=50))
+AGENT_DEPS = AgentDeps(api_key=GROQ_API_KEY, http_client=HTTP_CLIENT)
+
+# Agents are stateless between runs, so they are built once per process.
+# The chat model's system prompt depends on the chat and is passed per run.
+SUMMARIZER_MODEL: Agent[AgentDeps, str] = Agent(
+    model="groq:qwen-qwq-32b",
+    system_prompt=SUMMARIZER_PROMPT,
+    model_settings={"temperature": 0.4, "seed": 432},
+    deps_type=AgentDeps,
+)
+CHAT_MODEL: Agent[AgentDeps, str] = Agent(
+    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
+    model_settings={"temperature": 0.3},
+    deps_type=AgentDeps,
+)
+EXTRACTOR_MODEL: Agent[AgentDeps, ChatbotCodeOutput] = Agent(
+    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
+    system_prompt=EXTRACTION_SYSTEM_PROMPT,
+    model_settings={"temperature": 0.3},
+    deps_type=AgentDeps,
+    output_type=ChatbotCodeOutput,
+)
+JUDGE_MODEL: Agent[AgentDeps, JudgeOutput] = Agent(
+    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
+    system_prompt=JUDGE_SYSTEM_PROMPT,
+    output_type=JudgeOutput,
+    model_settings={"temperature": 0.3},
+    deps_type=AgentDeps,
+)
+CODE_REPLACEMENT_MODEL: Agent[AgentDeps, ReplacementOutput] = Agent(
+    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
+    system_prompt=CODE_REPLACEMENT_PROMPT,
+    model_settings={"temperature": 0.8},
+    output_type=ReplacementOutput,
+    deps_type=AgentDeps,
+)
+
+
+def format_chat_history(messages: List[Any]) -> str:
+    """Render the user/assistant turns of a conversation as one transcript string."""
+    # Joined in one pass rather than repeated += to avoid quadratic copying
+    return "".join(
+        ("User: " if type(m) == HumanMessage else "Assistant: ") + m.text() + "\n"
+        for m in messages
+        if type(m) in (HumanMessage, AIMessage)
+    )
+
+
+class CircuitBreaker:
+    """
+    Fails fast on a dependency after repeated errors.
+
+    After `threshold` consecutive failures the breaker opens for `cooldown`
+    seconds. Once that passes, a single call is let through to probe the
+    dependency while the others keep failing fast until the probe is recorded.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    def allow_request(self) -> bool:
+        if self._failures < self._threshold:
+            return True
+        if self._probing or time.monotonic() < self._open_until:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """Let another call probe when this one ended without an outcome (e.g. cancelled)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self._failures >= self._threshold:
+            self._open_until = time.monotonic() + self._cooldown
+
+
+# Runner replies by (code digest, language), so reflection passes that retry
+# the same snippet do not execute it again
+EXECUTION_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=60)
+RUNNER_BREAKER = CircuitBreaker(threshold=3, cooldown=30)
+
+
+async def execute_code(code: str, language: str | None) -> tuple[int, Any] | None:
+    """
+    Run code on the code runner.
+
+    Args:
+        code (str): The solution and validation code to execute.
+        language (str | None): The programming language of the code.
+
+    Returns:
+        tuple | None: The runner's status code and JSON reply, or None if the runner is unavailable.
+    """
+    key = (hashlib.blake2b(code.encode(), digest_size=16).digest(), language)
+    cached = EXECUTION_CACHE.get(key)
+    if cached is not None:
+        return cached
+    if not RUNNER_BREAKER.allow_request():
+        logger.warning("Code runner circuit open, skipping execution")
+        return None
+    try:
+        resp = await HTTP_CLIENT.post(
+            CODE_RUNNER_API_URL,
+            content=orjson.dumps({"code": code, "language": language}),
+            headers={"Content-Type": "application/json"},
+        )
+        execution = (resp.status_code, orjson.loads(resp.content))
+    except (HTTPError, orjson.JSONDecodeError) as e:
+        logger.warning(f"Code runner request failed: {e}")
+        RUNNER_BREAKER.record_failure()
+        return None
+    except BaseException:
+        RUNNER_BREAKER.release_probe()
+        raise
+    # The runner answers 500 with stderr when the submitted code fails, which
+    # is an ordinary result for the judge, not a sign the runner is down
+    RUNNER_BREAKER.record_success()
+    EXECUTION_CACHE[key] = execution
+    return execution
+
 
 class ChatBot:
     """
@@ -36,149 +185,117 @@ class ChatBot:
         summary: str | None = None,
         level: int = 0,
     ):
-        load_dotenv()
         self._messages = messages
         self._problem = problem.strip()
         self._summary = summary
         self._level = level
-        self._API_KEY = os.getenv("GROQ_API_KEY")
-        self._EXECUTE_URL = os.getenv("CODE_RUNNER_API_URL")
-        assert self._API_KEY, "Missing GROQ_API_KEY in .env"
-        assert self._EXECUTE_URL, "Missing CODE_RUNNER_API_URL in .env"
-
-        self._extractor_model: Agent[None, ChatbotCodeOutput]
-        self._chat_model: Agent[None, str]
-        self._code_replacement_model: Agent[None, ReplacementOutput]
-        self._judge_model: Agent[None, JudgeOutput]
-        self._deps = AgentDeps(api_key=self._API_KEY, http_client=AsyncClient)
-        self._chat_settings = {"temperature": 0.3}
-        self._judge_settings = {"temperature": 0.3}
-        self._replacement_settings = {"temperature": 0.8}
-        self._summarizer_settings = {"temperature": 0.4,"seed":432}
-        self._original_response = [False, ""]
-
-    async def should_run(
-        self, state: Dict[str, Any]
-    ) -> Literal["summarize", "call_model"]:
-        print("DEBUG: Entering should_run")
-        decision = "summarize" if len(state["messages"]) > 10 else "call_model"
-        print("DEBUG: Exiting should_run")
-        return decision
-
-    async def summarize(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering summarize")
-        print("Entering summarize")
-        self._chat_model = Agent(
-            model="groq:qwen-qwq-32b",
-            system_prompt=SUMMARIZER_PROMPT,
-            model_settings=self._summarizer_settings,
-            deps_type=AgentDeps,
-        )
-        # Making chat history into strings
-        chat_history = ""
-        for m in state["messages"]:
-            if type(m) == HumanMessage:
-                chat_history += "User: " + m.text() + "\n"
-            elif type(m) == AIMessage:
-                chat_history += "Assistant: " + m.text() + "\n"
-        result = await self._chat_model.run(
-            "Summarize the following:\n" + chat_history, deps=self._deps
+        # Fixed for the lifetime of the chat, so it is built once rather than per turn
+        self._system_message = ModelRequest(
+            parts=[
+                SystemPromptPart(
+                    content=f"{SYSTEM_PROMPT[level]}\n\nProblem:\n{self._problem}"
+                )
+            ]
         )
-        self._summary = "Summary of chat history" + result.output
-        print("Exiting summary")
-        print("DEBUG: Exiting summarize")
-        return state
 
-    async def call_model(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering call_model")
-        chat_history = ""
-        if self._summary:
-            chat_history += "The below is the chat history:\n"
-            for m in state["messages"]:
-                if type(m) == HumanMessage:
-                    chat_history += "User: " + m.text() + "\n"
-                elif type(m) == AIMessage:
-                    chat_history += "Assistant: " + m.text() + "\n"
-
-        FINAL_SYSTEM_PROMPT = (
-            SYSTEM_PROMPT[self._level]
-            + "\n\nProblem:\n"
-            + self._problem
-            + self._summary
-            if self._summary == ""
-            else chat_history
-        )
-        self._chat_model = Agent(
-            model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-            system_prompt=FINAL_SYSTEM_PROMPT,
-            model_settings=self._chat_settings,
-            deps_type=AgentDeps,
-        )
-        chat_result = await self._chat_model.run(
-            state["messages"][-1].content, deps=self._deps
+    @staticmethod
+    def should_summarize(state: Dict[str, Any]) -> bool:
+        return len(state["messages"]) > 10
+
+    @staticmethod
+    async def summarize(state: Dict[str, Any]) -> str:
+        logger.debug("Entering summarize")
+        result = await SUMMARIZER_MODEL.run(
+            "Summarize the following:\n" + format_chat_history(state["messages"]),
+            deps=AGENT_DEPS,
         )
+        logger.debug("Exiting summarize")
+        return "Summary of chat history" + result.output
 
-        state["messages"].append({"role": "assistant", "content": chat_result.output})
-        self._original_response[0] = True
-        self._original_response[1] += chat_result.output
+    @classmethod
+    async def call_model(cls, state: Dict[str, Any]) -> Dict[str, Any]:
+        # The summary only feeds the next turn's prompt, so on long chats it
+        # is generated concurrently with the reply instead of before it.
+        if cls.should_summarize(state):
+            summary, _ = await asyncio.gather(cls.summarize(state), cls.respond(state))
+            state["summary"] = summary
+        else:
+            await cls.respond(state)
+        return state
 
-        self._extractor_model = Agent(
-            model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-            system_prompt=EXTRACTION_SYSTEM_PROMPT,
-            model_settings=self._chat_settings,
-            deps_type=AgentDeps,
-            output_type=ChatbotCodeOutput,
-        )
+    @staticmethod
+    async def respond(state: Dict[str, Any]) -> None:
+        logger.debug("Entering respond")
+        # Every turn of every chat on the same problem and level opens with the
+        # same system message, so the provider can reuse its cached prompt prefix;
+        # the transcript of long chats goes after it rather than replacing it.
+        message_history = [state["system_message"]]
+        if state["summary"]:
+            chat_history = "The below is the chat history:\n" + format_chat_history(
+                state["messages"]
+            )
+            message_history.append(
+                ModelRequest(parts=[SystemPromptPart(content=chat_history)])
+            )
+        # Chunks go to the graph's "custom" stream (a no-op under ainvoke)
+        write = get_stream_writer()
+        chunks = []
+        async with CHAT_MODEL.run_stream(
+            state["messages"][-1].content,
+            message_history=message_history,
+            deps=AGENT_DEPS,
+        ) as chat_result:
+            async for chunk in chat_result.stream_text(delta=True):
+                chunks.append(chunk)
+                write(chunk)
+        output = "".join(chunks)
 
-        extractor_result = await self._extractor_model.run(
-            state["messages"][-1]["content"], deps=self._deps
-        )
-        if (
-            type(extractor_result.output) == ChatbotCodeOutput
-            and extractor_result.output["extracted_code"].lower() == "python"
-        ):
-            state["extract_code"] = ExtractCode(
-                extracted_code=extractor_result.output["extracted_code"],
-                validation_code=extractor_result.output["validation_code"],
-                language=extractor_result.output["extracted_code_language"],
+        state["messages"].append({"role": "assistant", "content": output})
+        state["original_response"] += output
+
+        # Only ask the extractor for code when the reply contains a code fence
+        if "```" in output:
+            extractor_result = await EXTRACTOR_MODEL.run(
+                state["messages"][-1]["content"], deps=AGENT_DEPS
             )
+            if (
+                type(extractor_result.output) == ChatbotCodeOutput
+                and extractor_result.output["extracted_code"].lower() == "python"
+            ):
+                state["extract_code"] = ExtractCode(
+                    extracted_code=extractor_result.output["extracted_code"],
+                    validation_code=extractor_result.output["validation_code"],
+                    language=extractor_result.output["extracted_code_language"],
+                )
 
-        print("DEBUG: Exiting call_model")
-        return state
+        logger.debug("Exiting respond")
 
-    async def try_running(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        print("DEBUG: Entering try_running")
+    @staticmethod
+    async def try_running(state: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("Entering try_running")
         if state["extract_code"]:
-            resp = requests.post(
-                self._EXECUTE_URL,
-                json={
-                    "code": state["extract_code"]["extracted_code"]+"\n\n\n"+state["extract_code"]["validation_code"],
-                    "language": state["extract_code"]["language"],
-                },
-            )
-            result = resp.json()
-            print(result)
-            if resp.status_code == 200:
+            code = state["extract_code"]["extracted_code"]+"\n\n\n"+state["extract_code"]["validation_code"]
+            execution = await execute_code(code, state["extract_code"]["language"])
+            if execution is None:
+                # Runner unavailable: keep the reply as is rather than failing the turn
+                state["extract_code"] = None
+                logger.debug("Exiting try_running")
+                return state
+            status_code, result = execution
+            logger.debug("code runner result %s", result)
+            if status_code == 200:
                 output = result.get("output")
             else:
                 output = result
 
-            self._judge_model = Agent(
-                model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-                system_prompt=JUDGE_SYSTEM_PROMPT,
-                output_type=JudgeOutput,
-                model_settings=self._judge_settings,
-                deps_type=AgentDeps,
-            )
-
-            judge_result = await self._judge_model.run(
+            judge_result = await JUDGE_MODEL.run(
                 user_prompt="Code:\n"
-                + state["extract_code"]["extracted_code"]+"\n\n\n"+state["extract_code"]["validation_code"]
+                + code
                 + "\nOutput"
                 + (output or "Error"),
-                deps=self._deps,
+                deps=AGENT_DEPS,
             )
-            print(judge_result.output)
+            logger.debug("judge output %s", judge_result.output)
             if not judge_result.output["passed"]:
                 state["messages"].append(
                     {
@@ -190,79 +307,92 @@ class ChatBot:
                     }
                 )
             else:
-                self._code_replacement_model = Agent(
-                    model="groq:meta-llama/llama-4-scout-17b-16e-instruct",
-                    system_prompt=CODE_REPLACEMENT_PROMPT,
-                    model_settings=self._replacement_settings,
-                    output_type = ReplacementOutput,
-                    deps_type=AgentDeps
-                )
-                prompt = "Original:\n"+self._original_response[1]+"\n\nUser-Provided Code:\n\n"+state["extract_code"]["extracted_code"]
-                replacement_result = await self._code_replacement_model.run(prompt)
+                prompt = "Original:\n"+state["original_response"]+"\n\nUser-Provided Code:\n\n"+state["extract_code"]["extracted_code"]
+                replacement_result = await CODE_REPLACEMENT_MODEL.run(prompt)
                 state["messages"].append({
                     "role":"assistant",
                     "content":'```python\n'+replacement_result.output.extracted_code+"```\n\n\n"+replacement_result.output.extracted_code_explanation
                 })
-                self._original_response[0] = False
             state["extract_code"] = None
-        print("DEBUG: Exiting try_running")
+        logger.debug("Exiting try_running")
         return state
 
-    async def create_reflection(self):
-        print("DEBUG: Entering create_reflection")
-        agent_graph = (
-            StateGraph(State)
-            .add_node(self.summarize, "summarize")
-            .add_node(self.call_model, "call_model")
-            .add_conditional_edges(START, self.should_run)
-            .add_edge("summarize", "call_model")
-            .add_edge("call_model", END)
-            .compile()
-        )
+    # The graphs only depend on the (static) node functions, with every
+    # per-chat value carried in the state, so they are compiled once per process.
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def create_reflection(cls):
+        logger.debug("Entering create_reflection")
+        agent_graph = cls.create_agent()
         judge_graph = (
             StateGraph(State)
-            .add_node(self.try_running, "try_running")
+            .add_node(cls.try_running, "try_running")
             .add_edge(START, "try_running")
             .add_edge("try_running", END)
             .compile()
         )
         reflection_graph = create_reflection_graph(agent_graph, judge_graph).compile()
-        print("DEBUG: Exiting create_reflection")
+        logger.debug("Exiting create_reflection")
         return reflection_graph
 
-    async def create_agent(self):
-        print("DEBUG: Entering create_agent")
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def create_agent(cls):
+        logger.debug("Entering create_agent")
         agent_graph = (
             StateGraph(State)
-            .add_node(self.summarize, "summarize")
-            .add_node(self.call_model, "call_model")
-            .add_conditional_edges(START, self.should_run)
-            .add_edge("summarize", "call_model")
+            .add_node(cls.call_model, "call_model")
+            .add_edge(START, "call_model")
             .add_edge("call_model", END)
             .compile()
         )
-        print("DEBUG: Exiting create_agent")
+        logger.debug("Exiting create_agent")
         return agent_graph
 
-    async def chat(self, message: str | None = None) -> Dict[str, str]:
-        result = None
+    def _start(self, message: str | None) -> tuple[Any, State]:
+        """Record the user's message and return the graph and initial state for this turn."""
         if message:
             self._messages.append({"role": "user", "content": message})
-        if self._level == 2:
-            graph = await self.create_reflection()
-            state = State(messages=self._messages, extract_code=None)
-            result = await graph.ainvoke(state)
-            return {
-                "response": result["messages"][-2].content,
-                "summary": self._summary,
-            }
-        else:
-            graph = await self.create_agent()
-            state = {
-                "messages": self._messages,
-            }
-            result = await graph.ainvoke(state)
-            return {
-                "response": result["messages"][-1].content,
-                "summary": self._summary,
-            }
+        state = State(
+            messages=self._messages,
+            extract_code=None,
+            system_message=self._system_message,
+            summary=self._summary,
+            original_response="",
+        )
+        graph = self.create_reflection() if self._level == 2 else self.create_agent()
+        return graph, state
+
+    def _finish(self, result: Dict[str, Any]) -> Dict[str, str]:
+        """Extract the reply and updated summary from the graph's final state."""
+        self._summary = result["summary"]
+        return {
+            "response": result["messages"][-2 if self._level == 2 else -1].content,
+            "summary": self._summary,
+        }
+
+    async def chat(self, message: str | None = None) -> Dict[str, str]:
+        graph, state = self._start(message)
+        result = await graph.ainvoke(state)
+        return self._finish(result)
+
+    async def stream_chat(
+        self, message: str | None = None
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        Run a chat turn, yielding the reply as it is generated.
+
+        Yields {"type": "delta", "content": ...} events for each chunk of model
+        output, then a single {"type": "result", ...} event carrying the same
+        response and summary that chat() returns.
+        """
+        graph, state = self._start(message)
+        result = None
+        async for namespace, mode, chunk in graph.astream(
+            state, stream_mode=["custom", "values"], subgraphs=True
+        ):
+            if mode == "custom":
+                yield {"type": "delta", "content": chunk}
+            elif not namespace:
+                result = chunk
+        yield {"type": "result", **self._finish(result)}
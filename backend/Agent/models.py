@@ -2,6 +2,7 @@ from typing import TypedDict, Annotated, Any
 from pydantic import BaseModel, Field
 from pydantic.dataclasses import dataclass
 from langgraph.graph.message import add_messages
+from pydantic_ai.messages import ModelRequest
 
 
 class ExtractCode(TypedDict):
@@ -34,10 +35,13 @@ class JudgeOutput(TypedDict):
 
 
 class State(TypedDict):
-    """State class containing messages and extracted code."""
+    """State class containing messages, extracted code and the per-chat context."""
 
     messages: Annotated[list, add_messages]
     extract_code: ExtractCode | None = None
+    system_message: ModelRequest
+    summary: str | None
+    original_response: str
 
 
 class ChatMessage(BaseModel):
@@ -47,8 +47,8 @@ async def register(user: RegisterReqModel, response: Response, request: Request)
         return {"error": "Error inserting user"}
 
     return AuthResModel(
-        REFRESH_TOKEN=await create_refresh_token(str(user_db["_id"])),
-        ACCESS_TOKEN=await create_access_token(str(user_db["_id"])),
+        REFRESH_TOKEN=create_refresh_token(str(user_db["_id"])),
+        ACCESS_TOKEN=create_access_token(str(user_db["_id"])),
     )
 
 
@@ -80,8 +80,8 @@ async def login(login_data: LoginReqModel, response: Response, request: Request)
             return {"error": "Invalid password"}
 
         return AuthResModel(
-            REFRESH_TOKEN=await create_refresh_token(str(user["_id"])),
-            ACCESS_TOKEN=await create_access_token(str(user["_id"])),
+            REFRESH_TOKEN=create_refresh_token(str(user["_id"])),
+            ACCESS_TOKEN=create_access_token(str(user["_id"])),
         )
     except Exception as e:
         logger.error(f"Error during login: {e}")
@@ -107,8 +107,8 @@ async def refresh_token(response: Response, user=Depends(get_current_user_refres
             response.status_code = status.HTTP_401_UNAUTHORIZED
             return {"error": "Invalid refresh token"}
         return {
-            "ACCESS_TOKEN": await create_access_token(user_id),
-            "REFRESH_TOKEN":await create_refresh_token(user_id)
+            "ACCESS_TOKEN": create_access_token(user_id),
+            "REFRESH_TOKEN":create_refresh_token(user_id)
         }
     except Exception as e:
         logger.error(f"Error during token refresh: {e}")
@@ -5,27 +5,35 @@ It includes functions for creating and verifying tokens, hashing passwords, and
 """
 
 import os
-from passlib.context import CryptContext
+import time
+import asyncio
+from cachetools import TTLCache
+import bcrypt
 from dotenv import load_dotenv
 from typing import Union, Any, Annotated
-from jose import jwt
+import jwt
 from bson import ObjectId
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 import datetime
-from jose.exceptions import ExpiredSignatureError
-from jwt.exceptions import InvalidTokenError
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 
 load_dotenv()
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24
 ALGORITHM = "HS256"
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_REFRESH_SECRET_KEY = os.getenv("JWT_REFRESH_SECRET_KEY")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Only the login path needs the password hash; token lookups never return it
+USER_AUTH_FIELDS = {"_id": 1, "email": 1, "password": 1}
+USER_PUBLIC_FIELDS = {"_id": 1, "username": 1, "email": 1}
+# Recently authenticated access tokens -> (user, token expiry), so repeat
+# requests from the same client skip the JWT decode and the Mongo lookup
+USER_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
 
 
 class TokenData(BaseModel):
@@ -43,7 +51,7 @@ async def get_user(db, email: str):
     Returns:
         The user object if found, otherwise None.
     """
-    user = await db.Users.find_one({"email": email})
+    user = await db.Users.find_one({"email": email}, projection=USER_AUTH_FIELDS)
     return user
 
 async def get_user_by_id(db, _id: ObjectId):
@@ -58,58 +66,57 @@ async def get_user_by_id(db, _id: ObjectId):
         The user object if found, otherwise None.
     """
     try:
-        user = await db.Users.find_one({"_id": _id})
+        user = await db.Users.find_one({"_id": _id}, projection=USER_PUBLIC_FIELDS)
         return user
     except Exception as e:
         return None
 
 
-async def create_access_token(
-    subject: Union[str, Any], expires_delta: int = None
+def create_access_token(
+    subject: Union[str, Any], expires_delta: datetime.timedelta = None
 ) -> str:
     """
     Create a new access token.
 
     Args:
         subject (Union[str, Any]): The subject of the token (e.g., user email).
-        expires_delta (int, optional): The token expiration time in minutes.
+        expires_delta (datetime.timedelta, optional): The token lifetime.
 
     Returns:
         str: The generated JWT access token.
     """
-    if expires_delta is not None:
-        expires_delta = datetime.datetime.now(datetime.timezone.utc) + expires_delta
-    else:
-        expires_delta = datetime.datetime.now(
-            datetime.timezone.utc
-        ) + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
+    now = datetime.datetime.now(datetime.UTC)
+    expires_at = now + (
+        expires_delta
+        if expires_delta is not None
+        else datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    to_encode = {"exp": expires_at, "sub": str(subject)}
+    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def create_refresh_token(
-    subject: Union[str, Any], expires_delta: int = None
+def create_refresh_token(
+    subject: Union[str, Any], expires_delta: datetime.timedelta = None
 ) -> str:
     """
     Create a new refresh token.
 
     Args:
         subject (Union[str, Any]): The subject of the token (e.g., Object ID).
-        expires_delta (int, optional): The token expiration time in minutes.
+        expires_delta (datetime.timedelta, optional): The token lifetime.
 
     Returns:
         str: The generated JWT refresh token.
     """
-    if expires_delta is not None:
-        expires_delta = datetime.datetime.now(datetime.timezone.utc) + expires_delta
-    else:
-        expires_delta = datetime.datetime.now(
-            datetime.timezone.utc
-        ) + datetime.timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
-
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
+    now = datetime.datetime.now(datetime.UTC)
+    expires_at = now + (
+        expires_delta
+        if expires_delta is not None
+        else datetime.timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
+    )
+    to_encode = {"exp": expires_at, "sub": str(subject)}
+    encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -124,7 +131,9 @@ async def verify_password(password: str, hashed_pass: str) -> bool:
     Returns:
         bool: True if the password matches the hash, False otherwise.
     """
-    return password_context.verify(password, hashed_pass)
+    return await asyncio.to_thread(
+        bcrypt.checkpw, password.encode(), hashed_pass.encode()
+    )
 
 
 async def get_hashed_password(password: str) -> str:
@@ -137,7 +146,10 @@ async def get_hashed_password(password: str) -> str:
     Returns:
         str: The hashed password.
     """
-    return password_context.hash(password)
+    hashed = await asyncio.to_thread(
+        bcrypt.hashpw, password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    )
+    return hashed.decode()
 
 
 async def get_current_user_refresh(request: Request):
@@ -165,15 +177,14 @@ async def get_current_user_refresh(request: Request):
         _id = payload.get("sub")
         if _id is None:
             raise credentials_exception
-    except (InvalidTokenError, ValueError):
-        raise credentials_exception
-    
     except ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except (InvalidTokenError, ValueError):
+        raise credentials_exception
     
     user = await get_user_by_id(request.app.database, ObjectId(_id))
     if user is None:
@@ -199,6 +210,9 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = USER_CACHE.get(token)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
         _id = ObjectId(payload.get("sub"))
@@ -207,12 +221,13 @@ async def get_current_user(
         user = await get_user_by_id(request.app.database, _id=_id)
         if user is None:
             raise credentials_exception
+        USER_CACHE[token] = (user, payload["exp"])
         return user
-    except InvalidTokenError:
-        raise credentials_exception
     except ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+    except InvalidTokenError:
+        raise credentials_exception
\ No newline at end of file
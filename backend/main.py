@@ -8,6 +8,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from Auth.routes import auth_router
 from Agent import agent_router
+from Agent.agent import HTTP_CLIENT
 from Database.routes import db_router
 from dotenv import load_dotenv
 import os
@@ -37,12 +38,14 @@ async def db_lifespan(app: FastAPI):
             raise Exception("Problem connecting to database cluster.")
         else:
             print("✅ Connected to the database cluster.")
+        await app.database["Users"].create_index("email", unique=True)
     except Exception as e:
         print(e)
 
     yield
 
     app.mongodb_client.close()
+    await HTTP_CLIENT.aclose()
 
 app: FastAPI = FastAPI(lifespan=db_lifespan,debug=True)
 app.include_router(router=auth_router)